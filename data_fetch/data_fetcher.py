@@ -1,30 +1,274 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
 import yfinance as yf
 import pandas as pd
+from curl_cffi import requests as curl_requests
+from curl_cffi.requests.exceptions import ConnectionError, HTTPError, Timeout
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
-def get_data(tickers, start='2020-01-01'):
-    """Get stock data and returns."""
-    data = yf.download(tickers, start=start,auto_adjust=True)['Close']
+
+CACHE_DIR = Path("~/.markowitz").expanduser()
+PRICES_TTL = 86400       # 1 day for Close history
+MARKET_CAP_TTL = 43200   # 12 hours for market caps
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per `period` seconds, shared across threads."""
+
+    def __init__(self, rate, period):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._updated) * self.rate / self.period
+            self._tokens = min(self.rate, self._tokens + refill)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens * self.period / self.rate)
+
+# Yahoo starts answering 429 well above this
+_LIMITER = RateLimiter(60, 60)  # 60 requests/min
+
+class LimitedSession(curl_requests.Session):
+    """curl_cffi Session that takes a _LIMITER token before every request."""
+
+    def request(self, *args, **kwargs):
+        time.sleep(_LIMITER.reserve())
+        return super().request(*args, **kwargs)
+
+# Used by yf.download and the crumb fetch. Recent yfinance only accepts
+# curl_cffi sessions; impersonating Chrome's TLS fingerprint avoids Yahoo's
+# 429s, and the session keeps its connections alive between requests. The
+# quote batches use an AsyncSession with the same cookies and _LIMITER.
+_SESSION = LimitedSession(impersonate="chrome", verify=True)
+
+def _is_fresh(path, ttl):
+    """True if the cache file exists and is younger than ttl seconds."""
+    return path.exists() and time.time() - path.stat().st_mtime < ttl
+
+def download_prices(tickers, start='2020-01-01'):
+    """Download raw Close prices for tickers in one multi-ticker request (cached on disk for a day)."""
+    symbols = [tickers] if isinstance(tickers, str) else sorted(tickers)
+    key = hashlib.sha1(f"{start}|{','.join(symbols)}".encode()).hexdigest()
+    cache_path = CACHE_DIR / 'prices' / f'{key}.pkl'
+
+    if _is_fresh(cache_path, PRICES_TTL):
+        return pd.read_pickle(cache_path)
+    data = yf.download(tickers, start=start, auto_adjust=True, session=_SESSION)['Close']
+    # A ticker that failed to download comes back as an all-NaN column; don't cache partial results
+    if not data.empty and not np.any(data.isna().all()):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        data.to_pickle(cache_path)
+    return data
+
+def to_returns(data):
+    """Clean a Close price frame and compute its returns."""
     data = data.dropna()  # Drop rows where all data is NaN
-    returns = data.pct_change(fill_method=None).dropna()
+    # Simple returns in one contiguous NumPy pass
+    P = data.values
+    returns = pd.DataFrame(P[1:] / P[:-1] - 1, index=data.index[1:], columns=data.columns)
+    returns = returns.dropna().astype(np.float32)
 
     return data, returns
 
-def get_market_caps(tickers):
-    """Get market capitalizations for tickers."""
-    market_caps = {}
-    for ticker in tickers:
+def get_data(tickers, start='2020-01-01'):
+    """Get stock data and returns."""
+    return to_returns(download_prices(tickers, start=start))
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+COOKIE_URL = "https://fc.yahoo.com"
+CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+QUOTE_BATCH = 20       # Max symbols per quote request
+MAX_CONCURRENCY = 8    # Higher concurrency triggers rate limits
+
+_crumb = None
+_crumb_lock = threading.Lock()
+
+def _is_retryable(exc):
+    """Retry timeouts, dropped connections, rate limits (429) and server errors."""
+    if isinstance(exc, (Timeout, ConnectionError)):
+        return True
+    if not isinstance(exc, HTTPError) or exc.response is None:
+        return False
+    status = exc.response.status_code
+    return status == 429 or status >= 500
+
+# Shared by the crumb fetch and the quote batches
+_retry = retry(wait=wait_exponential(multiplier=1, max=30), retry=retry_if_exception(_is_retryable),
+               stop=stop_after_attempt(5), reraise=True)
+
+@_retry
+def _fetch_crumb():
+    """Set Yahoo's cookie on _SESSION and read the crumb tied to it."""
+    try:
+        _SESSION.get(COOKIE_URL)  # Only sets the cookie, the page itself 404s
+    except Exception:
+        pass
+    resp = _SESSION.get(CRUMB_URL)
+    resp.raise_for_status()
+    return resp.text.strip()
+
+def _get_crumb(stale=None):
+    """Fetch Yahoo's cookie and crumb once; the quote endpoint rejects requests without them.
+
+    Passing the crumb a request was rejected with refetches it, unless another
+    batch has already replaced it.
+    """
+    global _crumb
+    with _crumb_lock:
+        if _crumb is None or _crumb == stale:
+            _crumb = _fetch_crumb()
+        return _crumb
+
+@_retry
+async def _fetch_quote_batch(http, semaphore, chunk, crumb):
+    """Fetch one batch of quotes; transient failures propagate so they are retried."""
+    async with semaphore:
+        await asyncio.sleep(_LIMITER.reserve())
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            market_caps[ticker] = info.get('marketCap', 1e9)  # Default 1B if missing
-        except:
-            market_caps[ticker] = 1e9  # Fallback
-    
+            for attempt in range(2):
+                try:
+                    resp = await http.get(QUOTE_URL, params={'symbols': ','.join(chunk), 'crumb': crumb})
+                    resp.raise_for_status()
+                    data = resp.json()
+                    break
+                except HTTPError as exc:
+                    if attempt or exc.response is None or exc.response.status_code != 401:
+                        raise
+                    crumb = await asyncio.to_thread(_get_crumb, crumb)  # Stale crumb, retry once
+        except (HTTPError, ValueError) as exc:  # ValueError: body is not JSON
+            if _is_retryable(exc):
+                raise
+            warnings.warn(f"Quote request failed for {chunk} ({exc}); "
+                          f"treating their market caps as missing")
+            return []
+        finally:
+            await asyncio.sleep(random.uniform(0.3, 0.8))  # Jitter between batches
+    return data.get('quoteResponse', {}).get('result') or []
+
+# Market caps already fetched, shared across portfolios: symbol -> (cap, fetched_at).
+# Persisted to MARKET_CAP_FILE so re-runs within MARKET_CAP_TTL skip the network.
+MARKET_CAP_FILE = CACHE_DIR / 'market_caps.json'
+_market_cap_cache = None
+_market_cap_lock = threading.Lock()
+
+def _cached_caps():
+    """Fresh market caps from memory, loading the on-disk cache on first use."""
+    global _market_cap_cache
+    with _market_cap_lock:
+        if _market_cap_cache is None:
+            try:
+                _market_cap_cache = {sym: tuple(v) for sym, v in
+                                     json.loads(MARKET_CAP_FILE.read_text()).items()}
+            except (OSError, ValueError):
+                _market_cap_cache = {}
+        now = time.time()
+        return {sym: cap for sym, (cap, fetched_at) in _market_cap_cache.items()
+                if now - fetched_at < MARKET_CAP_TTL}
+
+def _store_caps(caps):
+    """Add fetched market caps to the cache and write it back to disk."""
+    now = time.time()
+    with _market_cap_lock:
+        _market_cap_cache.update({sym: (cap, now) for sym, cap in caps.items()})
+        MARKET_CAP_FILE.parent.mkdir(parents=True, exist_ok=True)
+        MARKET_CAP_FILE.write_text(json.dumps(_market_cap_cache))
+# Symbols currently being fetched, so concurrent callers await one request
+_inflight = {}
+
+async def fetch_market_caps_async(tickers):
+    """Fetch raw market caps concurrently from the quote endpoint (None if missing)."""
+    loop = asyncio.get_running_loop()
+    cached = _cached_caps()
+    results = {t: cached[t] for t in tickers if t in cached}
+    waiting = {t: _inflight[t] for t in tickers
+               if t not in results and t in _inflight and _inflight[t].get_loop() is loop}
+    missing = [t for t in dict.fromkeys(tickers) if t not in results and t not in waiting]
+
+    futures = {t: loop.create_future() for t in missing}
+    _inflight.update(futures)
+    try:
+        chunks = [missing[i:i+QUOTE_BATCH] for i in range(0, len(missing), QUOTE_BATCH)]
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        crumb = await asyncio.to_thread(_get_crumb) if chunks else None
+
+        # Same cookies as _SESSION, which the crumb is tied to
+        async with curl_requests.AsyncSession(impersonate="chrome", cookies=_SESSION.cookies,
+                                              max_clients=MAX_CONCURRENCY) as http:
+            batches = await asyncio.gather(*[_fetch_quote_batch(http, semaphore, chunk, crumb)
+                                             for chunk in chunks])
+
+        caps = {quote['symbol']: quote.get('marketCap') for batch in batches for quote in batch}
+        for t in missing:
+            results[t] = caps.get(t)
+            futures[t].set_result(results[t])
+        found = {t: results[t] for t in missing if results[t] is not None}
+        if found:
+            _store_caps(found)
+    except Exception as exc:
+        # Waiters on these symbols get the real error, not a CancelledError
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(exc)
+                future.exception()  # Mark retrieved so unawaited futures don't log it
+        raise
+    except BaseException:
+        for future in futures.values():
+            future.cancel()
+        raise
+    finally:
+        for t in missing:
+            _inflight.pop(t, None)
+
+    for t, future in waiting.items():
+        results[t] = await future
+    return {ticker: results[ticker] for ticker in tickers}
+
+# One background event loop for all sync callers, so _inflight coalesces
+# requests across threads and the notebook's own running loop is left alone
+_loop = None
+_loop_lock = threading.Lock()
+
+def _run(coro):
+    """Run a coroutine from sync code on the shared background loop."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+def fetch_market_caps(tickers):
+    """Fetch raw market caps for tickers (None if missing)."""
+    return _run(fetch_market_caps_async(list(tickers)))
+
+async def get_market_caps_async(tickers):
+    """Get market cap weights for tickers."""
+    caps = await fetch_market_caps_async(list(tickers))
+    market_caps = {ticker: cap or 1e9 for ticker, cap in caps.items()}  # Default 1B if missing
+
     # Convert to weights
     total_cap = sum(market_caps.values())
     return {ticker: cap/total_cap for ticker, cap in market_caps.items()}
 
+def get_market_caps(tickers):
+    """Get market capitalizations for tickers."""
+    return _run(get_market_caps_async(tickers))
+
 # Stock lists
 TECH = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META']
 US = ['AAPL', 'MSFT', 'JPM', 'JNJ', 'WMT', 'PG', 'V', 'UNH']
-MEXICAN = ['WALMEX.MX', 'CEMEXCPO.MX', 'BIMBOA.MX', 'GMEXICOB.MX']
\ No newline at end of file
+MEXICAN = ['WALMEX.MX', 'CEMEXCPO.MX', 'BIMBOA.MX', 'GMEXICOB.MX']
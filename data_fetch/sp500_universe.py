@@ -4,14 +4,31 @@ Clean, reliable data source for major US companies.
 """
 
 import pandas as pd
-import yfinance as yf
-import numpy as np
+
+from data_fetch.data_fetcher import CACHE_DIR, _is_fresh, download_prices, fetch_market_caps
+
+# Delisted/renamed tickers in the CSV; GOOGL dropped to use GOOG instead
+_EXCLUDE_SET = frozenset(['GOOGL', 'ANSS', 'ABC', 'AGN', 'ALXN',
+                          'ANTM', 'AET', 'ANDV', 'ADS', 'ATVI', 'CTL', 'APC', 'BHGE',
+                          'COG', 'CHK'])
+
+# Portfolio entries returned by analyze_sp500_portfolio
+PORTFOLIO_KEYS = ('tech', 'healthcare', 'financials', 'diversified', 'large_cap')
+
+SP500_CACHE = CACHE_DIR / 'sp500.csv'
+SP500_CACHE_TTL = 7 * 86400  # The constituent list changes quarterly at most
 
 def load_sp500_data():
-    """Load S&P 500 tickers from reliable source."""
+    """Load S&P 500 tickers from reliable source (cached on disk for a week)."""
     url = "https://gist.githubusercontent.com/ZeccaLehn/f6a2613b24c393821f81c0c1d23d4192/raw/fe4638cc5561b9b261225fd8d2a9463a04e77d19/SP500.csv"
+    dtype = {'Symbol': 'string', 'Sector': 'category'}
     
-    df = pd.read_csv(url)
+    if _is_fresh(SP500_CACHE, SP500_CACHE_TTL):
+        df = pd.read_csv(SP500_CACHE, dtype=dtype)
+    else:
+        df = pd.read_csv(url, dtype=dtype)
+        SP500_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(SP500_CACHE, index=False)
     print(f"Loaded {len(df)} S&P 500 companies")
     print(f"Columns: {list(df.columns)}")
     
@@ -62,6 +79,7 @@ def get_stocks_by_sector(df, sector=None, top_n=20):
         
         # Get sector distribution
         sector_counts = df['Sector'].value_counts()
+        sector_counts = sector_counts[sector_counts > 0]  # Categorical keeps empty sectors
         print(f"\nS&P 500 Sector Distribution:")
         for sector, count in sector_counts.items():
             print(f"  {sector:<25}: {count:>3} companies")
@@ -70,9 +88,13 @@ def get_stocks_by_sector(df, sector=None, top_n=20):
         diversified_stocks = []
         stocks_per_sector = max(1, top_n // len(sector_counts))
         
+        # First stocks_per_sector rows of every sector in one groupby pass
+        top_rows = df.groupby('Sector', sort=False, observed=True).head(stocks_per_sector)
+        by_sector = top_rows.groupby('Sector', observed=True)['Symbol'].apply(list)
+        
         print(f"\nSelecting ~{stocks_per_sector} stocks per sector:")
         for sector in sector_counts.index:
-            sector_stocks = df[df['Sector'] == sector]['Symbol'].head(stocks_per_sector).tolist()
+            sector_stocks = by_sector[sector]
             diversified_stocks.extend(sector_stocks)
             print(f"  {sector:<25}: {sector_stocks}")
         
@@ -84,34 +106,19 @@ def get_stocks_by_market_cap(df, top_n=20):
     print(f"Fetching market cap data for S&P 500 stocks...")
     
     market_cap_data = []
-    symbols = df['Symbol'].tolist()
-    
-    # Process in smaller batches
-    batch_size = 25
-    for i in range(0, min(len(symbols), 100), batch_size):  # Limit to first 100 for speed
-        batch = symbols[i:i+batch_size]
-        print(f"Processing batch {i//batch_size + 1}")
-        
-        for symbol in batch:
-            try:
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
-                
-                market_cap = info.get('marketCap')
-                if market_cap:
-                    market_cap_data.append({
-                        'Symbol': symbol,
-                        'Company': df[df['Symbol'] == symbol]['Name'].iloc[0],
-                        'Sector': df[df['Symbol'] == symbol]['Sector'].iloc[0],
-                        'MarketCap': market_cap,
-                        'MarketCapB': market_cap / 1e9
-                    })
-                    
-            except:
-                continue
-        
-        import time
-        time.sleep(0.2)  # Be nice to the API
+    symbols = df['Symbol'].tolist()[:100]  # Limit to first 100 for speed
+    name_by_sym = df.set_index('Symbol')['Name'].to_dict()
+    sector_by_sym = df.set_index('Symbol')['Sector'].to_dict()
+    
+    for symbol, market_cap in fetch_market_caps(symbols).items():
+        if market_cap:
+            market_cap_data.append({
+                'Symbol': symbol,
+                'Company': name_by_sym[symbol],
+                'Sector': sector_by_sym[symbol],
+                'MarketCap': market_cap,
+                'MarketCapB': market_cap / 1e9
+            })
     
     # Sort by market cap
     market_cap_df = pd.DataFrame(market_cap_data)
@@ -132,9 +139,7 @@ def analyze_sp500_portfolio():
     
     # Load S&P 500 data
     sp500_df = load_sp500_data()
-    sp500_df = sp500_df[sp500_df['Symbol'].isin(['GOOGL','ANSS','ABC', 'AGN', 'ALXN',
-                                                 'ANTM','AET','ANDV','ADS', 'ATVI', 'CTL', 'APC','BHGE',
-                                                 'COG','CHK'])==False] # Use GOOGL instead
+    sp500_df = sp500_df[~sp500_df['Symbol'].isin(_EXCLUDE_SET)]
     # Different portfolio selection strategies
     print(f"\n1. Information Technology Sector:")
     tech_stocks = get_stocks_by_sector(sp500_df, 'Information Technology', 12)
@@ -151,14 +156,21 @@ def analyze_sp500_portfolio():
     print(f"\n5. Largest by Market Cap:")
     large_cap_stocks = get_stocks_by_market_cap(sp500_df, 15)
     
-    return {
+    portfolios = {
         'tech': tech_stocks,
         'healthcare': health_stocks,
         'financials': finance_stocks,
         'diversified': diversified_stocks,
         'large_cap': large_cap_stocks,
-        'sp500_df': sp500_df
     }
+    
+    # One download for every portfolio; analyze() slices out its columns
+    all_syms = sorted(set().union(*[portfolios[k] for k in PORTFOLIO_KEYS]))
+    print(f"\nDownloading prices for {len(all_syms)} unique symbols...")
+    portfolios['prices'] = download_prices(all_syms)
+    portfolios['sp500_df'] = sp500_df
+    
+    return portfolios
 
 if __name__ == "__main__":
     portfolios = analyze_sp500_portfolio()
@@ -169,9 +181,7 @@ if __name__ == "__main__":
     print(f"Diversified portfolio: {portfolios['diversified']}")
     
     # Now you can use these with your existing optimizer:
-    # from data import get_data
-    # from optimize import Portfolio
+    # from example import analyze
     # 
-    # prices, returns = get_data(portfolios['tech'])
-    # portfolio = Portfolio(returns)
-    # max_sharpe = portfolio.max_sharpe()
\ No newline at end of file
+    # portfolio, strategies = analyze("Tech", portfolios['tech'], portfolios['prices'])
+    # max_sharpe = strategies['Max Sharpe']
\ No newline at end of file
@@ -1,11 +1,16 @@
-from data_fetch.data_fetcher import get_data, get_market_caps, TECH, US
+import argparse
+
+from data_fetch.data_fetcher import get_data, get_market_caps, to_returns, TECH, US
 from optimizer import Portfolio
 
-def analyze(name, tickers):
+def analyze(name, tickers, prices=None):
     print(f"\n=== {name} ===")
     
-    # Get data
-    prices, returns = get_data(tickers)
+    # Get data (slice already downloaded prices when given)
+    if prices is not None:
+        prices, returns = to_returns(prices[tickers])
+    else:
+        prices, returns = get_data(tickers)
     market_caps = get_market_caps(tickers)
     portfolio = Portfolio(returns)
     
@@ -24,14 +29,19 @@ def analyze(name, tickers):
     return portfolio, strategies
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Markowitz portfolio optimization example")
+    parser.add_argument('--plot', action='store_true', help="save weight and frontier plots")
+    args = parser.parse_args()
+    
     tech_portfolio, tech_strategies = analyze("Tech Stocks", TECH)
     us_portfolio, us_strategies = analyze("US Stocks", US)
     
-    # Plot pie charts
-    print("\nShowing portfolio allocations...")
-    tech_portfolio.plot_weights(tech_strategies['Max Sharpe'], "Tech - Max Sharpe Portfolio")
-    tech_portfolio.plot_weights(tech_strategies['Market Cap'], "Tech - Market Cap Weights")
-    
-    # Plot efficient frontier
-    print("\nShowing efficient frontier...")
-    tech_portfolio.plot_frontier()
\ No newline at end of file
+    if args.plot:
+        # Plot pie charts
+        print("\nShowing portfolio allocations...")
+        tech_portfolio.plot_weights(tech_strategies['Max Sharpe'], "Tech - Max Sharpe Portfolio")
+        tech_portfolio.plot_weights(tech_strategies['Market Cap'], "Tech - Market Cap Weights")
+        
+        # Plot efficient frontier
+        print("\nShowing efficient frontier...")
+        tech_portfolio.plot_frontier()
@@ -1,98 +1,187 @@
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
 from scipy.optimize import minimize
 import csv
 import os
 
+def _neg_sharpe(weights, mean, cov):
+    """Negative Sharpe ratio and its gradient (SLSQP objective)."""
+    cov_w = np.dot(cov, weights)
+    ret = np.dot(weights, mean)
+    var = np.dot(weights, cov_w)
+    vol = np.sqrt(var)
+    grad = -(mean * var - ret * cov_w) / (var * vol)
+    return -ret / vol, grad  # Negative for minimization
+
+def _volatility(weights, cov):
+    """Portfolio volatility and its gradient (SLSQP objective)."""
+    cov_w = np.dot(cov, weights)
+    vol = np.sqrt(np.dot(weights, cov_w))
+    return vol, cov_w / vol
+
+_fig = None  # Frontier figure, cleared and reused on every plot_frontier call
+
+def _pyplot():
+    """Import pyplot on first use, with the non-interactive Agg backend."""
+    import matplotlib
+    if not matplotlib.get_backend().lower().startswith('agg'):
+        matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    return plt
+
+def _frontier_figure():
+    """Return the shared frontier figure, cleared."""
+    global _fig
+    if _fig is None:
+        _fig = _pyplot().figure(figsize=(10, 6))
+    else:
+        _fig.clear()
+    return _fig
+
 class Portfolio:
     def __init__(self, returns):
         self.returns = returns
         self.assets = list(returns.columns)
-        self.mean = returns.mean() * 252  # Annualize
-        self.cov = returns.cov() * 252    # Annualize
+        # Annualize with NumPy on the contiguous return matrix; float32 is ample
+        # for return estimates and halves the memory traffic
+        self._R = np.ascontiguousarray(returns.values, dtype=np.float32)
+        self._mean_np = self._R.mean(axis=0) * np.float32(252)
+        # atleast_2d: np.cov of a single asset is 0-d
+        self._cov_np = np.atleast_2d(np.cov(self._R, rowvar=False, ddof=1, dtype=np.float32) * np.float32(252))
+        # Labelled copies, used for plotting
+        self.mean = pd.Series(self._mean_np, index=self.assets)
+        self.cov = pd.DataFrame(self._cov_np, index=self.assets, columns=self.assets)
+        # Cholesky factor for the closed-form solves (None if cov is singular)
+        try:
+            # float64: in float32 a singular cov can factor and give NaN solves
+            self._chol = cho_factor(self._cov_np.astype(np.float64), lower=True)
+        except np.linalg.LinAlgError:
+            self._chol = None
+        # Solved portfolios; returns are fixed after init so results are reusable
+        self._cache = {}
     
     def max_sharpe(self):
         """Find portfolio with maximum Sharpe ratio."""
-        n = len(self.assets)
-        
-        def neg_sharpe(weights):
-            ret = np.dot(weights, self.mean)
-            vol = np.sqrt(np.dot(weights, np.dot(self.cov, weights)))
-            return -ret / vol  # Negative for minimization
-        
-        constraints = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1}
-        bounds = [(0, 1) for _ in range(n)]
-        guess = [1/n] * n
-        
-        result = minimize(neg_sharpe, guess, bounds=bounds, constraints=constraints)
-        return dict(zip(self.assets, result.x))
+        if 'max_sharpe' in self._cache:
+            return dict(self._cache['max_sharpe'])
+        result = self._solve(_neg_sharpe, args=(self._mean_np, self._cov_np))
+        self._cache['max_sharpe'] = dict(zip(self.assets, result.x))
+        return dict(self._cache['max_sharpe'])
     
     def min_vol(self):
         """Find portfolio with minimum volatility."""
+        if 'min_vol' in self._cache:
+            return dict(self._cache['min_vol'])
         n = len(self.assets)
         
-        def volatility(weights):
-            return np.sqrt(np.dot(weights, np.dot(self.cov, weights)))
-        
-        constraints = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1}
-        bounds = [(0, 1) for _ in range(n)]
-        guess = [1/n] * n
+        # Closed form w = inv(cov) 1 / (1' inv(cov) 1), valid when no bound binds
+        if self._chol is not None:
+            w = self._long_only(cho_solve(self._chol, np.ones(n)))
+            if w is not None:
+                self._cache['min_vol'] = dict(zip(self.assets, w))
+                return dict(self._cache['min_vol'])
         
-        result = minimize(volatility, guess, bounds=bounds, constraints=constraints)
-        return dict(zip(self.assets, result.x))
+        result = self._solve(_volatility, args=(self._cov_np,))
+        self._cache['min_vol'] = dict(zip(self.assets, result.x))
+        return dict(self._cache['min_vol'])
+    
+    def _weights_array(self, weights):
+        """Weights as an array in asset order (accepts a dict or array)."""
+        if isinstance(weights, dict):
+            return np.array([weights[asset] for asset in self.assets])
+        return np.asarray(weights)
     
     def stats(self, weights):
         """Get portfolio stats."""
-        w = np.array([weights[asset] for asset in self.assets])
-        ret = np.dot(w, self.mean)
-        vol = np.sqrt(np.dot(w, np.dot(self.cov, w)))
+        w = self._weights_array(weights)
+        ret = np.dot(w, self._mean_np)
+        vol = np.sqrt(np.dot(w, np.dot(self._cov_np, w)))
         sharpe = ret / vol
         return {'return': ret, 'volatility': vol, 'sharpe': sharpe}
     
+    def stats_batch(self, W):
+        """Get stats for a (n_strategies, n_assets) weight matrix."""
+        W = np.atleast_2d(W)
+        rets = W @ self._mean_np
+        vols = np.sqrt(np.einsum('ij,jk,ik->i', W, self._cov_np, W))
+        return {'return': rets, 'volatility': vols, 'sharpe': rets / vols}
+    
     def efficient_frontier(self, n_points=50):
         """Calculate efficient frontier points."""
+        key = ('frontier', n_points)
+        if key in self._cache:
+            vols, rets = self._cache[key]
+            return vols.copy(), rets.copy()
+        
         # Get min and max returns
         min_vol_weights = self.min_vol()
         min_ret = self.stats(min_vol_weights)['return']
-        max_ret = self.mean.max() * 0.95  # Slightly below single best asset
+        max_ret = self._mean_np.max() * 0.95  # Slightly below single best asset
         
         # Target returns
         target_returns = np.linspace(min_ret, max_ret, n_points)
         
-        frontier_vols = []
-        frontier_rets = []
+        # Two-fund theorem: every frontier portfolio is a mix of inv(cov) 1 and
+        # inv(cov) mean, so all targets are solved with one batched solve
+        W = np.full((n_points, len(self.assets)), -1.0)
+        if self._chol is not None:
+            X = cho_solve(self._chol, np.column_stack([np.ones(len(self.assets)), self._mean_np]))
+            M = np.array([[X[:, 0].sum(), X[:, 1].sum()],
+                          [self._mean_np @ X[:, 0], self._mean_np @ X[:, 1]]])
+            try:
+                coef = np.linalg.solve(M, np.vstack([np.ones(n_points), target_returns]))
+                W = (X @ coef).T
+            except np.linalg.LinAlgError:
+                pass  # One asset or mean proportional to ones; SLSQP handles every target
         
-        for target in target_returns:
+        # Targets where a weight goes negative need the long-only solver
+        keep = (W >= -1e-10).all(axis=1)
+        W = np.clip(W, 0, 1)
+        for i in np.flatnonzero(~keep):
             try:
-                weights = self._optimize_for_return(target)
+                weights = self._optimize_for_return(target_returns[i])
                 if weights:
-                    stats = self.stats(weights)
-                    frontier_rets.append(stats['return'])
-                    frontier_vols.append(stats['volatility'])
+                    W[i] = [weights[asset] for asset in self.assets]
+                    keep[i] = True
             except:
                 continue
         
-        return np.array(frontier_vols), np.array(frontier_rets)
+        W = W[keep]
+        frontier_rets = W @ self._mean_np
+        frontier_vols = np.sqrt(np.einsum('ij,jk,ik->i', W, self._cov_np, W))
+        
+        self._cache[key] = (frontier_vols, frontier_rets)
+        return frontier_vols.copy(), frontier_rets.copy()
     
     def _optimize_for_return(self, target_return):
         """Find min volatility portfolio for target return."""
-        n = len(self.assets)
-        
-        def volatility(weights):
-            return np.sqrt(np.dot(weights, np.dot(self.cov, weights)))
+        mean, cov = self._mean_np, self._cov_np
         
-        constraints = [
-            {'type': 'eq', 'fun': lambda x: np.sum(x) - 1},
-            {'type': 'eq', 'fun': lambda x: np.dot(x, self.mean) - target_return}
-        ]
+        # Only reached for targets whose two-fund weights went negative, so
+        # the unconstrained solution is already known to fail: go to SLSQP
+        target = {'type': 'eq', 'fun': lambda x: np.dot(x, mean) - target_return, 'jac': lambda x: mean}
+        result = self._solve(_volatility, [target], args=(cov,))
+        return dict(zip(self.assets, result.x)) if result.success else None
+    
+    def _solve(self, objective, constraints=(), args=()):
+        """Minimize objective over fully invested long-only weights with SLSQP."""
+        n = len(self.assets)
+        budget = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones(n)}
         bounds = [(0, 1) for _ in range(n)]
         guess = [1/n] * n
         
-        result = minimize(volatility, guess, bounds=bounds, constraints=constraints)
-        return dict(zip(self.assets, result.x)) if result.success else None
+        # ftol matches float32 precision of mean/cov
+        return minimize(objective, guess, args=args, jac=True, bounds=bounds,
+                        constraints=[budget, *constraints], options={'ftol': 1e-6})
     
+    @staticmethod
+    def _long_only(w, tol=1e-10):
+        """Normalized weights if the unconstrained solution is long-only, else None."""
+        w = w / w.sum()
+        if not np.isfinite(w).all() or (w < -tol).any():
+            return None  # Degenerate, or bounds bind: needs the constrained solver
+        return np.clip(w, 0, 1)
     
     def market_cap_weights(self, market_caps):
         """Market cap weighted portfolio (efficient market benchmark)."""
@@ -115,18 +204,23 @@ class Portfolio:
         assets = list(filtered_weights.keys())
         values = list(filtered_weights.values())
         
-        plt.figure(figsize=(8, 6))
-        plt.pie(values, labels=assets, autopct='%1.1f%%', startangle=90)
-        plt.title(title)
-        plt.axis('equal')
+        # Plain Figure on an Agg canvas, no pyplot state machine
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        
+        fig = Figure(figsize=(8, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.pie(values, labels=assets, autopct='%1.1f%%', startangle=90)
+        ax.set_title(title)
+        ax.axis('equal')
         
         if save:
             filename = f"{title.replace(' ', '_').replace('-', '').lower()}.png"
-            plt.savefig(f'visualizations/{filename}', dpi=150, bbox_inches='tight')
+            fig.savefig(f'visualizations/{filename}', dpi=150, bbox_inches='tight')
             print(f"Saved plot: {filename}")
         else:
-            plt.show()
-        plt.close()
+            return fig
     
     def plot_frontier(self, save=True,fname=None):
         """Plot efficient frontier."""
@@ -140,35 +234,35 @@ class Portfolio:
         vol_stats = self.stats(min_vol)
         
         # Plot
-        plt.figure(figsize=(10, 6))
-        plt.plot(vols, rets, 'b-', linewidth=2, label='Efficient Frontier')
-        plt.plot(sharpe_stats['volatility'], sharpe_stats['return'], 'r*', 
+        fig = _frontier_figure()
+        ax = fig.add_subplot()
+        ax.plot(vols, rets, 'b-', linewidth=2, label='Efficient Frontier')
+        ax.plot(sharpe_stats['volatility'], sharpe_stats['return'], 'r*', 
                 markersize=15, label=f'Max Sharpe ({sharpe_stats["sharpe"]:.2f})')
-        plt.plot(vol_stats['volatility'], vol_stats['return'], 'g*', 
+        ax.plot(vol_stats['volatility'], vol_stats['return'], 'g*', 
                 markersize=15, label='Min Volatility')
         
         # Individual assets
-        for i, asset in enumerate(self.assets):
-            vol = np.sqrt(self.cov.iloc[i, i])
-            ret = self.mean.iloc[i]
-            plt.plot(vol, ret, 'ko', alpha=0.7)
-            plt.annotate(asset, (vol, ret), xytext=(5, 5), 
+        asset_vols = np.sqrt(np.diag(self._cov_np))
+        asset_rets = self._mean_np
+        ax.scatter(asset_vols, asset_rets, c='k', alpha=0.7)
+        for asset, vol, ret in zip(self.assets, asset_vols, asset_rets):
+            ax.annotate(asset, (vol, ret), xytext=(5, 5), 
                         textcoords='offset points', fontsize=9)
         
-        plt.xlabel('Volatility')
-        plt.ylabel('Expected Return')
-        plt.title('Efficient Frontier')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
+        ax.set_xlabel('Volatility')
+        ax.set_ylabel('Expected Return')
+        ax.set_title('Efficient Frontier')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
         
         if save:
             if fname is None:
                 fname = 'efficient_frontier.png'
-            plt.savefig(f'visualizations/{fname}', dpi=150, bbox_inches='tight')
+            fig.savefig(f'visualizations/{fname}', dpi=150, bbox_inches='tight')
             print(f"Saved plot: {fname}")
         else:
-            plt.show()
-        plt.close()
+            _pyplot().show()
     
     def compare_all(self, market_caps=None, name='portfolio'):
         """Compare all strategies."""
@@ -184,9 +278,12 @@ class Portfolio:
         print(f"{'Strategy':<15} | {'Return':<8} | {'Vol':<8} | {'Sharpe':<6}")
         print("-" * 50)
         
+        W = np.vstack([self._weights_array(weights) for weights in strategies.values()])
+        batch = self.stats_batch(W)
+        
         rows = []
-        for strat_name, weights in strategies.items():
-            stats = self.stats(weights)
+        for i, strat_name in enumerate(strategies):
+            stats = {k: v[i] for k, v in batch.items()}
             print(f"{strat_name:<15} | {stats['return']:>6.1%} | {stats['volatility']:>6.1%} | {stats['sharpe']:>6.2f}")
             row = {
                 'name': name,